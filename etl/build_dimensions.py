@@ -4,141 +4,190 @@ Akhdar BI Command Center - Build Dimension Tables
 Populate the star schema dimension tables.
 """
 import logging
-import hashlib
 from sqlalchemy import text
 from etl.config import get_engine
 
 logger = logging.getLogger(__name__)
 
 
+# ----------------------------------------------------------------------
+# Statements are built once at import time so SQLAlchemy's compiled-
+# statement cache is keyed on a stable object across pipeline runs.
+# ----------------------------------------------------------------------
+
+# Session knobs scoped to the build transaction - roomy work_mem for
+# the customer hash aggregate, parallel workers for the scans, and no
+# sync commit since the build is rerunnable.
+_SQL_SESSION_TUNING = text("""
+    SET LOCAL work_mem = '256MB';
+    SET LOCAL max_parallel_workers_per_gather = 4;
+    SET LOCAL synchronous_commit = off;
+""")
+
+_SQL_DIM_PRODUCT = text("""
+    INSERT INTO warehouse.dim_product (
+        internal_sku, product_handle, product_title, size_ml,
+        recipe_id, product_category, vendor, variant_price, is_active
+    )
+    SELECT
+        skm.internal_sku,
+        skm.product_handle,
+        skm.lineitem_name as product_title,
+        skm.size_ml,
+        skm.recipe_id,
+        skm.product_category,
+        COALESCE(p.vendor, 'Akhdar Perfumes') as vendor,
+        COALESCE(p.variant_price, 10.50) as variant_price,
+        skm.is_active
+    FROM staging.stg_product_sku_map skm
+    LEFT JOIN staging.stg_products p ON skm.product_handle = p.handle
+    ON CONFLICT (internal_sku) DO UPDATE SET
+        product_handle = EXCLUDED.product_handle,
+        product_title = EXCLUDED.product_title,
+        size_ml = EXCLUDED.size_ml,
+        recipe_id = EXCLUDED.recipe_id,
+        product_category = EXCLUDED.product_category,
+        vendor = EXCLUDED.vendor,
+        variant_price = EXCLUDED.variant_price,
+        is_active = EXCLUDED.is_active;
+""")
+
+_SQL_DIM_CUSTOMER = text("""
+    -- Orders (more complete than the customer export) and the customer
+    -- export are stacked with UNION ALL and collapsed in one hash
+    -- aggregate per email - no join between the two sources at all.
+    -- FILTER picks order metrics from the 'o' rows and profile
+    -- attributes from the 'c' rows; HAVING keeps only emails that have
+    -- actually ordered, matching the old orders-driven semantics.
+    WITH unified AS (
+        SELECT 'o' as source, email_lc, email_hash, order_id, created_at,
+               subtotal - refunded_amount as net_sales,
+               NULL::BIGINT as customer_id, NULL as city, NULL as province,
+               NULL as province_code, NULL as country, NULL as country_code,
+               NULL::BOOLEAN as accepts_email_marketing,
+               NULL::BOOLEAN as accepts_sms_marketing
+        FROM staging.stg_orders
+        WHERE email IS NOT NULL AND email != ''
+        UNION ALL
+        SELECT 'c', email_lc, NULL, NULL, NULL, NULL,
+               customer_id, city, province, province_code,
+               country, country_code,
+               accepts_email_marketing, accepts_sms_marketing
+        FROM staging.stg_customers
+        WHERE email IS NOT NULL AND email != ''
+    )
+    INSERT INTO warehouse.dim_customer (
+        customer_id_hash, customer_id, city, province, province_code,
+        country, country_code, accepts_email_marketing, accepts_sms_marketing,
+        first_order_date, total_orders, total_spent, customer_segment
+    )
+    SELECT
+        MAX(email_hash) as customer_id_hash,
+        MAX(customer_id) FILTER (WHERE source = 'c') as customer_id,
+        MAX(city) FILTER (WHERE source = 'c') as city,
+        MAX(province) FILTER (WHERE source = 'c') as province,
+        MAX(province_code) FILTER (WHERE source = 'c') as province_code,
+        MAX(country) FILTER (WHERE source = 'c') as country,
+        MAX(country_code) FILTER (WHERE source = 'c') as country_code,
+        COALESCE(BOOL_OR(accepts_email_marketing), false),
+        COALESCE(BOOL_OR(accepts_sms_marketing), false),
+        DATE(MIN(created_at) FILTER (WHERE source = 'o')) as first_order_date,
+        COUNT(DISTINCT order_id) FILTER (WHERE source = 'o') as total_orders,
+        COALESCE(SUM(net_sales) FILTER (WHERE source = 'o'), 0) as total_spent,
+        CASE
+            WHEN COUNT(DISTINCT order_id) FILTER (WHERE source = 'o') = 1 THEN 'new'
+            WHEN COUNT(DISTINCT order_id) FILTER (WHERE source = 'o') >= 2 THEN 'returning'
+            ELSE 'prospect'
+        END as customer_segment
+    FROM unified
+    GROUP BY email_lc
+    HAVING COUNT(*) FILTER (WHERE source = 'o') > 0
+    ON CONFLICT (customer_id_hash) DO UPDATE SET
+        customer_id = EXCLUDED.customer_id,
+        city = EXCLUDED.city,
+        province = EXCLUDED.province,
+        province_code = EXCLUDED.province_code,
+        country = EXCLUDED.country,
+        country_code = EXCLUDED.country_code,
+        accepts_email_marketing = EXCLUDED.accepts_email_marketing,
+        accepts_sms_marketing = EXCLUDED.accepts_sms_marketing,
+        first_order_date = EXCLUDED.first_order_date,
+        total_orders = EXCLUDED.total_orders,
+        total_spent = EXCLUDED.total_spent,
+        customer_segment = EXCLUDED.customer_segment;
+""")
+
+_SQL_DIM_SHIPPING_METHOD = text("""
+    INSERT INTO warehouse.dim_shipping_method (
+        shipping_method_code, shipping_method_name, is_local_delivery
+    )
+    SELECT DISTINCT
+        LOWER(REPLACE(shipping_method, ' ', '_')) as shipping_method_code,
+        shipping_method as shipping_method_name,
+        LOWER(shipping_method) LIKE '%local%' as is_local_delivery
+    FROM staging.stg_orders
+    WHERE shipping_method IS NOT NULL AND shipping_method != ''
+
+    -- UNION ALL: the branches cannot overlap (the second only fires
+    -- when there are no shipping methods at all), so skip the dedup
+    UNION ALL
+
+    SELECT 'unknown', 'Unknown', false
+    WHERE NOT EXISTS (
+        SELECT 1 FROM staging.stg_orders
+        WHERE shipping_method IS NOT NULL AND shipping_method != ''
+    )
+    ON CONFLICT (shipping_method_code) DO NOTHING;
+""")
+
+_SQL_DIM_MATERIAL = text("""
+    INSERT INTO warehouse.dim_material (
+        material_id, material_name, ingredient_match, category, unit,
+        cost_per_unit, cost_per_ml, has_known_cost, supplier
+    )
+    SELECT
+        material_id, material_name, ingredient_match, category, unit,
+        cost_per_unit, cost_per_ml, has_known_cost, supplier
+    FROM staging.stg_material_costs
+    ON CONFLICT (material_id) DO UPDATE SET
+        material_name = EXCLUDED.material_name,
+        ingredient_match = EXCLUDED.ingredient_match,
+        category = EXCLUDED.category,
+        unit = EXCLUDED.unit,
+        cost_per_unit = EXCLUDED.cost_per_unit,
+        cost_per_ml = EXCLUDED.cost_per_ml,
+        has_known_cost = EXCLUDED.has_known_cost,
+        supplier = EXCLUDED.supplier;
+""")
+
+
 def build_dimensions():
     """Build all dimension tables from staging data."""
     engine = get_engine()
-    
-    with engine.connect() as conn:
+
+    # One transaction for the whole build - a single commit at the end.
+    with engine.begin() as conn:
+        conn.execute(_SQL_SESSION_TUNING)
+
         # dim_date is already populated in schema creation
         logger.info("dim_date already populated from schema init")
-        
+
         # Build dim_product
         logger.info("Building warehouse.dim_product...")
-        conn.execute(text("""
-            TRUNCATE TABLE warehouse.dim_product CASCADE;
-            
-            INSERT INTO warehouse.dim_product (
-                internal_sku, product_handle, product_title, size_ml,
-                recipe_id, product_category, vendor, variant_price, is_active
-            )
-            SELECT 
-                skm.internal_sku,
-                skm.product_handle,
-                skm.lineitem_name as product_title,
-                skm.size_ml,
-                skm.recipe_id,
-                skm.product_category,
-                COALESCE(p.vendor, 'Akhdar Perfumes') as vendor,
-                COALESCE(p.variant_price, 10.50) as variant_price,
-                skm.is_active
-            FROM staging.stg_product_sku_map skm
-            LEFT JOIN staging.stg_products p ON skm.product_handle = p.handle;
-        """))
-        conn.commit()
-        
+        conn.execute(_SQL_DIM_PRODUCT)
+
         # Build dim_customer with hashed emails
         logger.info("Building warehouse.dim_customer...")
-        conn.execute(text("""
-            TRUNCATE TABLE warehouse.dim_customer CASCADE;
-            
-            -- First, get unique customers from orders (more complete than customer export)
-            WITH order_customers AS (
-                SELECT DISTINCT
-                    email,
-                    MIN(created_at) as first_order_date
-                FROM staging.stg_orders
-                WHERE email IS NOT NULL AND email != ''
-                GROUP BY email
-            ),
-            customer_stats AS (
-                SELECT
-                    email,
-                    COUNT(DISTINCT order_id) as total_orders,
-                    SUM(net_sales) as total_spent
-                FROM (
-                    SELECT order_id, email, subtotal - refunded_amount as net_sales
-                    FROM staging.stg_orders
-                ) o
-                GROUP BY email
-            )
-            INSERT INTO warehouse.dim_customer (
-                customer_id_hash, customer_id, city, province, province_code,
-                country, country_code, accepts_email_marketing, accepts_sms_marketing,
-                first_order_date, total_orders, total_spent, customer_segment
-            )
-            SELECT 
-                encode(sha256(LOWER(oc.email)::bytea), 'hex') as customer_id_hash,
-                c.customer_id,
-                c.city,
-                c.province,
-                c.province_code,
-                c.country,
-                c.country_code,
-                COALESCE(c.accepts_email_marketing, false),
-                COALESCE(c.accepts_sms_marketing, false),
-                DATE(oc.first_order_date) as first_order_date,
-                COALESCE(cs.total_orders, 0) as total_orders,
-                COALESCE(cs.total_spent, 0) as total_spent,
-                CASE 
-                    WHEN COALESCE(cs.total_orders, 0) = 0 THEN 'prospect'
-                    WHEN COALESCE(cs.total_orders, 0) = 1 THEN 'new'
-                    WHEN COALESCE(cs.total_orders, 0) >= 2 THEN 'returning'
-                    ELSE 'unknown'
-                END as customer_segment
-            FROM order_customers oc
-            LEFT JOIN staging.stg_customers c ON LOWER(oc.email) = LOWER(c.email)
-            LEFT JOIN customer_stats cs ON LOWER(oc.email) = LOWER(cs.email);
-        """))
-        conn.commit()
-        
+        conn.execute(_SQL_DIM_CUSTOMER)
+
         # Build dim_shipping_method
         logger.info("Building warehouse.dim_shipping_method...")
-        conn.execute(text("""
-            TRUNCATE TABLE warehouse.dim_shipping_method CASCADE;
-            
-            INSERT INTO warehouse.dim_shipping_method (
-                shipping_method_code, shipping_method_name, is_local_delivery
-            )
-            SELECT DISTINCT
-                LOWER(REPLACE(shipping_method, ' ', '_')) as shipping_method_code,
-                shipping_method as shipping_method_name,
-                LOWER(shipping_method) LIKE '%local%' as is_local_delivery
-            FROM staging.stg_orders
-            WHERE shipping_method IS NOT NULL AND shipping_method != ''
-            
-            UNION
-            
-            SELECT 'unknown', 'Unknown', false
-            WHERE NOT EXISTS (
-                SELECT 1 FROM staging.stg_orders 
-                WHERE shipping_method IS NOT NULL AND shipping_method != ''
-            );
-        """))
-        conn.commit()
-        
+        conn.execute(_SQL_DIM_SHIPPING_METHOD)
+
         # Build dim_material
         logger.info("Building warehouse.dim_material...")
-        conn.execute(text("""
-            TRUNCATE TABLE warehouse.dim_material CASCADE;
-            
-            INSERT INTO warehouse.dim_material (
-                material_id, material_name, ingredient_match, category, unit,
-                cost_per_unit, cost_per_ml, has_known_cost, supplier
-            )
-            SELECT 
-                material_id, material_name, ingredient_match, category, unit,
-                cost_per_unit, cost_per_ml, has_known_cost, supplier
-            FROM staging.stg_material_costs;
-        """))
-        conn.commit()
-        
+        conn.execute(_SQL_DIM_MATERIAL)
+
         logger.info("Dimension tables built successfully!")
 
 
@@ -2,9 +2,10 @@
 Akhdar BI Command Center - Database Configuration
 =================================================
 """
+import functools
 import os
 from sqlalchemy import create_engine
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 
 # Database connection settings
 DB_CONFIG = {
@@ -22,9 +23,17 @@ def get_connection_string():
         f"@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
     )
 
+@functools.lru_cache(maxsize=1)
 def get_engine():
-    """Create SQLAlchemy engine."""
-    return create_engine(get_connection_string(), poolclass=NullPool)
+    """Create (once) the SQLAlchemy engine with a real connection pool
+    (the loaders and staging builds run concurrent stages)."""
+    return create_engine(
+        get_connection_string(),
+        poolclass=QueuePool,
+        pool_size=8,
+        max_overflow=4,
+        pool_pre_ping=True,
+    )
 
 # File paths
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -4,10 +4,25 @@ Akhdar BI Command Center - Raw Data Ingestion
 Load CSV files into raw PostgreSQL tables.
 Tables are created dynamically from CSV structure.
 """
+import hashlib
+import io
 import os
+import re
 import pandas as pd
 import logging
-from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.extras import execute_values
+from sqlalchemy import inspect, text
+from etl.load_raw import copy_buffer_to_table
+
+# PyArrow's CSV reader is multithreaded and much lighter on the
+# allocator than pandas' parser; fall back to pandas if it is absent.
+try:
+    import pyarrow as pa
+    from pyarrow import compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
 from etl.config import (
     get_engine, 
     DATA_RAW_DIR, 
@@ -25,31 +40,132 @@ from etl.config import (
 logger = logging.getLogger(__name__)
 
 
+# Precompiled once: parens are dropped, separators become underscores
+_COL_DROP_RE = re.compile(r'[()]')
+_COL_SEP_RE = re.compile(r'[ /\-.:]')
+
+# Mirrors 02_raw_tables.sql; created lazily too so direct loader calls
+# work before schema init has run
+_MANIFEST_DDL = """
+    CREATE TABLE IF NOT EXISTS raw.ingest_manifest (
+        table_name VARCHAR(100) PRIMARY KEY,
+        source_path TEXT,
+        sha256 CHAR(64),
+        row_count INTEGER,
+        loaded_at TIMESTAMPTZ DEFAULT now()
+    )
+"""
+
+# Meta Ads export columns (cleaned) -> our raw.meta_ads schema
+_META_ADS_COLUMN_MAPPING = {
+    'campaign_name': 'campaign_name',
+    'reach': 'reach',
+    'frequency': 'frequency',
+    'impressions': 'impressions',
+    'cpm_cost_per_1_000_impressions': 'cpm',
+    'amount_spent_usd': 'amount_spent',
+    'link_clicks': 'link_clicks',
+    'cpc_cost_per_link_click': 'cpc',
+    'ctr_link_click_through_rate': 'ctr',
+    'landing_page_views': 'landing_page_views',
+}
+
+
+def _ensure_manifest(engine):
+    """
+    Create raw.ingest_manifest if it is missing. CREATE TABLE IF NOT
+    EXISTS is not race-safe when loader threads run concurrently, so
+    serialize the check-and-create on an advisory lock.
+    """
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            "SELECT pg_advisory_xact_lock(hashtext('raw.ingest_manifest'))"
+        )
+        conn.exec_driver_sql(_MANIFEST_DDL)
+        conn.commit()
+
+
 def clean_column_name(col: str) -> str:
     """Convert column name to snake_case for Postgres."""
-    return (
-        col.lower()
-        .replace(' ', '_')
-        .replace('(', '')
-        .replace(')', '')
-        .replace('/', '_')
-        .replace('-', '_')
-        .replace('.', '_')
-        .replace(':', '_')
-    )
+    return _COL_SEP_RE.sub('_', _COL_DROP_RE.sub('', col.lower()))
+
+
+def _insert_execute_values(table, conn, keys, data_iter):
+    """
+    to_sql method: pack rows into mogrified multi-row INSERTs with
+    psycopg2's execute_values - far fewer statements than executemany.
+    """
+    cols = ', '.join(f'"{k}"' for k in keys)
+    name = f'{table.schema}.{table.name}' if table.schema else table.name
+    with conn.connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            f'INSERT INTO {name} ({cols}) VALUES %s',
+            data_iter,
+            page_size=1000,
+        )
 
 
-def strip_apostrophe_prefix(value):
-    """Remove leading apostrophe from values (e.g., '77083 -> 77083)."""
-    if isinstance(value, str) and value.startswith("'"):
-        return value[1:]
-    return value
+def read_csv_all_str(filepath: str, usecols=None,
+                     strip_apostrophe_prefix: bool = False) -> pd.DataFrame:
+    """
+    Read a CSV with every column as string and empty cells as '',
+    matching pd.read_csv(dtype=str, keep_default_na=False) semantics.
+
+    Uses PyArrow's parallel CSV reader when installed, pandas otherwise.
+
+    Args:
+        filepath: Path to CSV file
+        usecols: Optional predicate on raw header names; columns it
+                 rejects are never parsed or allocated
+        strip_apostrophe_prefix: Drop a leading ' from values (Shopify
+                 exports one to force text formatting, e.g. '77083)
+    """
+    if pa is None:
+        df = pd.read_csv(filepath, dtype=str, keep_default_na=False,
+                         usecols=usecols)
+        if strip_apostrophe_prefix:
+            df = df.replace(r"^'", '', regex=True)
+        return df
+
+    # Infer-then-force would lose leading zeros, so read the header
+    # first and pin every column to string.
+    header = pd.read_csv(filepath, nrows=0)
+    columns = [c for c in header.columns if usecols is None or usecols(c)]
+    table = pa_csv.read_csv(
+        filepath,
+        read_options=pa_csv.ReadOptions(block_size=8 << 20),
+        # Shopify exports quote multiline values (notes, addresses);
+        # Arrow rejects them unless told newlines can appear in fields
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={c: pa.string() for c in columns},
+            null_values=[],  # keep '' and 'NA' as literal strings
+            strings_can_be_null=False,
+        ),
+    )
+    if strip_apostrophe_prefix:
+        # One vectorized kernel per column over Arrow's contiguous
+        # string buffers, before any pandas objects exist
+        table = pa.table(
+            {
+                name: pc.if_else(
+                    pc.starts_with(col, "'"),
+                    pc.utf8_slice_codeunits(col, 1),
+                    col,
+                )
+                for name, col in zip(table.column_names, table.columns)
+            }
+        )
+    return table.to_pandas()
 
 
 def load_csv_to_table(filepath: str, table_name: str, engine) -> bool:
     """
     Load a CSV file into a raw PostgreSQL table.
-    Uses if_exists='replace' to dynamically create tables from CSV structure.
+    Creates the table from the CSV structure on first load; re-loads
+    TRUNCATE and refill it unless the column set has drifted.
     
     Args:
         filepath: Path to CSV file
@@ -62,41 +178,87 @@ def load_csv_to_table(filepath: str, table_name: str, engine) -> bool:
     if not os.path.exists(filepath):
         logger.warning(f"File not found: {filepath}")
         return False
-    
+
     try:
-        # Read CSV - all as strings to preserve data
-        df = pd.read_csv(filepath, dtype=str, keep_default_na=False)
-        
+        # Skip the whole load when the file's content hash matches what
+        # the manifest says is already in the table
+        hasher = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(chunk)
+        file_hash = hasher.hexdigest()
+
+        schema, table = table_name.split('.')
+        inspector = inspect(engine)
+        _ensure_manifest(engine)
+        with engine.connect() as conn:
+            previous_hash = conn.execute(
+                text("SELECT sha256 FROM raw.ingest_manifest WHERE table_name = :t"),
+                {'t': table_name}
+            ).scalar()
+        if previous_hash == file_hash and inspector.has_table(table, schema=schema):
+            logger.info(f"Unchanged file, skipping: {filepath}")
+            return True
+
+        # Read CSV - all as strings to preserve data; the apostrophe
+        # prefixes are stripped inside the reader (columnar, pre-pandas)
+        df = read_csv_all_str(filepath, strip_apostrophe_prefix=True)
+
         if df.empty:
             logger.warning(f"Empty file: {filepath}")
             return False
-        
+
         # Clean column names for Postgres compatibility
         df.columns = [clean_column_name(col) for col in df.columns]
-        
-        # Strip apostrophe prefixes from all values
-        for col in df.columns:
-            df[col] = df[col].apply(strip_apostrophe_prefix)
-        
-        # Add loaded_at timestamp
-        df['loaded_at'] = pd.Timestamp.now()
-        
-        # Parse schema and table
-        schema, table = table_name.split('.')
-        
-        # Use replace to dynamically create/recreate table
+
+        # Reuse the existing table when its columns still match the CSV
+        # (keeps indexes and planner stats); recreate only on schema
+        # drift or first load. loaded_at is ours, not the CSV's.
+        reuse_table = (
+            inspector.has_table(table, schema=schema)
+            and {c['name'] for c in inspector.get_columns(table, schema=schema)}
+            == set(df.columns) | {'loaded_at'}
+        )
+        if not reuse_table:
+            with engine.connect() as conn:
+                df.head(0).to_sql(
+                    table,
+                    conn,
+                    schema=schema,
+                    if_exists='replace',  # Creates table if not exists
+                    index=False
+                )
+                # Server-side default instead of shipping the same
+                # timestamp once per row
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {schema}.{table} '
+                    f'ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ DEFAULT now()'
+                )
+                conn.commit()
+
+        # Stream the rows through COPY - one payload instead of per-row
+        # INSERTs; TRUNCATE+COPY share a transaction on reuse.
+        buf = io.StringIO()
+        df.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        copy_buffer_to_table(engine, schema, table, buf,
+                             columns=list(df.columns), truncate=reuse_table)
+
+        # Record what we loaded for the next run's skip check, and give
+        # the planner fresh stats before staging queries the table
         with engine.connect() as conn:
-            df.to_sql(
-                table,
-                conn,
-                schema=schema,
-                if_exists='replace',  # Creates table if not exists
-                index=False,
-                method='multi',
-                chunksize=1000
-            )
+            conn.exec_driver_sql(f'ANALYZE {schema}.{table}')
+            conn.execute(text("""
+                INSERT INTO raw.ingest_manifest (table_name, source_path, sha256, row_count)
+                VALUES (:t, :p, :h, :n)
+                ON CONFLICT (table_name) DO UPDATE SET
+                    source_path = EXCLUDED.source_path,
+                    sha256 = EXCLUDED.sha256,
+                    row_count = EXCLUDED.row_count,
+                    loaded_at = now()
+            """), {'t': table_name, 'p': filepath, 'h': file_hash, 'n': len(df)})
             conn.commit()
-        
+
         logger.info(f"Loaded {len(df)} rows into {table_name}")
         return True
         
@@ -124,23 +286,34 @@ def load_raw_data(use_sample: bool = False):
         file_mappings = RAW_FILE_MAPPINGS
         logger.info("Loading RAW data from Shopify exports")
     
-    # Load main data files
-    for filename, table_name in file_mappings.items():
-        filepath = os.path.join(data_dir, filename)
-        load_csv_to_table(filepath, table_name, engine)
-    
-    # Always load reference files from reference directory
-    logger.info("Loading reference data (SKU map)")
-    for filename, table_name in REFERENCE_FILE_MAPPINGS.items():
-        filepath = os.path.join(DATA_REFERENCE_DIR, filename)
-        load_csv_to_table(filepath, table_name, engine)
-    
-    # Load private reference files (costs, recipes) from raw directory
-    logger.info("Loading private reference data (materials, recipes)")
-    for filename, table_name in PRIVATE_REFERENCE_MAPPINGS.items():
-        filepath = os.path.join(DATA_RAW_DIR, filename)
-        load_csv_to_table(filepath, table_name, engine)
-    
+    # Collect every (filepath, table) pair - main exports, the SKU map
+    # from the reference directory, and the private costs/recipes files
+    logger.info("Loading reference data (SKU map) and private reference data")
+    tasks = [
+        (os.path.join(data_dir, filename), table_name)
+        for filename, table_name in file_mappings.items()
+    ]
+    tasks += [
+        (os.path.join(DATA_REFERENCE_DIR, filename), table_name)
+        for filename, table_name in REFERENCE_FILE_MAPPINGS.items()
+    ]
+    tasks += [
+        (os.path.join(DATA_RAW_DIR, filename), table_name)
+        for filename, table_name in PRIVATE_REFERENCE_MAPPINGS.items()
+    ]
+
+    # The files are independent, so load them concurrently: each thread
+    # parses its CSV (GIL released in the parser) while others are
+    # blocked on COPY writes.
+    with ThreadPoolExecutor(max_workers=min(8, len(tasks))) as executor:
+        futures = [
+            executor.submit(load_csv_to_table, filepath, table_name, engine)
+            for filepath, table_name in tasks
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+
     # Try to load optional files (Meta ads, GSC) - don't fail if missing
     logger.info("Attempting to load optional data sources...")
     for filename, table_name in OPTIONAL_FILE_MAPPINGS.items():
@@ -166,29 +339,22 @@ def load_raw_data(use_sample: bool = False):
 def load_meta_ads(filepath: str, engine):
     """Load Meta Ads data with special handling for format."""
     try:
-        df = pd.read_csv(filepath, dtype=str, keep_default_na=False)
-        
+        # Only parse the columns we map into our schema - wide Meta
+        # exports carry many more we would otherwise drop unread
+        df = read_csv_all_str(
+            filepath,
+            usecols=lambda c: clean_column_name(c) in _META_ADS_COLUMN_MAPPING
+        )
+
         if df.empty:
             logger.warning("Meta ads file is empty")
             return
-        
+
         # Clean column names
         df.columns = [clean_column_name(col) for col in df.columns]
-        
-        # Map columns to our schema
-        column_mapping = {
-            'campaign_name': 'campaign_name',
-            'reach': 'reach',
-            'frequency': 'frequency',
-            'impressions': 'impressions',
-            'cpm_cost_per_1_000_impressions': 'cpm',
-            'amount_spent_usd': 'amount_spent',
-            'link_clicks': 'link_clicks',
-            'cpc_cost_per_link_click': 'cpc',
-            'ctr_link_click_through_rate': 'ctr',
-            'landing_page_views': 'landing_page_views',
-        }
-        
+
+        column_mapping = _META_ADS_COLUMN_MAPPING
+
         # Rename columns that exist
         rename_map = {k: v for k, v in column_mapping.items() if k in df.columns}
         df = df.rename(columns=rename_map)
@@ -196,12 +362,32 @@ def load_meta_ads(filepath: str, engine):
         # Keep only columns we need
         keep_cols = [c for c in column_mapping.values() if c in df.columns]
         df = df[keep_cols]
-        
-        # Add loaded_at
-        df['loaded_at'] = pd.Timestamp.now()
-        
+
+        # Convert the metric columns so they cross the wire as numbers
+        # instead of formatted text. No downcast: float32 loses exact
+        # integers past 2^24 and cents on five-figure spend.
+        numeric_cols = [c for c in keep_cols if c != 'campaign_name']
+        df[numeric_cols] = (
+            df[numeric_cols]
+            .replace(r'[$,%]', '', regex=True)
+            .apply(pd.to_numeric, errors='coerce')
+        )
+
         with engine.connect() as conn:
-            df.to_sql('meta_ads', conn, schema='raw', if_exists='replace', index=False)
+            df.to_sql(
+                'meta_ads',
+                conn,
+                schema='raw',
+                if_exists='replace',
+                index=False,
+                method=_insert_execute_values
+            )
+            # loaded_at is filled server-side, not shipped per row
+            conn.exec_driver_sql(
+                'ALTER TABLE raw.meta_ads '
+                'ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ DEFAULT now()'
+            )
+            conn.exec_driver_sql('ANALYZE raw.meta_ads')
             conn.commit()
         
         logger.info(f"Loaded {len(df)} rows into raw.meta_ads")
@@ -213,7 +399,7 @@ def load_meta_ads(filepath: str, engine):
 def load_gsc_data(filepath: str, engine):
     """Load Google Search Console Chart.csv data."""
     try:
-        df = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+        df = read_csv_all_str(filepath)
         
         if df.empty:
             logger.warning("GSC file is empty")
@@ -222,11 +408,20 @@ def load_gsc_data(filepath: str, engine):
         # Clean column names
         df.columns = [clean_column_name(col) for col in df.columns]
         
-        # Add loaded_at
-        df['loaded_at'] = pd.Timestamp.now()
-        
         with engine.connect() as conn:
-            df.to_sql('gsc_daily', conn, schema='raw', if_exists='replace', index=False)
+            df.to_sql(
+                'gsc_daily',
+                conn,
+                schema='raw',
+                if_exists='replace',
+                index=False,
+                method=_insert_execute_values
+            )
+            conn.exec_driver_sql(
+                'ALTER TABLE raw.gsc_daily '
+                'ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ DEFAULT now()'
+            )
+            conn.exec_driver_sql('ANALYZE raw.gsc_daily')
             conn.commit()
         
         logger.info(f"Loaded {len(df)} rows into raw.gsc_daily")
@@ -0,0 +1,47 @@
+"""
+Akhdar BI Command Center - COPY Helpers for Raw Loads
+======================================================
+Thin wrappers around PostgreSQL COPY FROM STDIN for bulk-loading the
+raw tier. COPY moves bytes one to two orders of magnitude faster than
+row-at-a-time INSERT fanout, so loaders should stream through these
+helpers whenever the source is already CSV-shaped.
+"""
+def copy_buffer_to_table(engine, schema: str, table: str, buffer,
+                         columns=None, truncate: bool = False) -> int:
+    """
+    Stream a headerless CSV buffer into schema.table via COPY FROM STDIN.
+
+    Args:
+        engine: SQLAlchemy engine
+        schema: Target schema name
+        table: Target table name
+        buffer: File-like object positioned at the start of CSV data
+                (no header row)
+        columns: Optional list of target column names; when given, COPY
+                 fills only these and lets defaults cover the rest
+        truncate: If True, TRUNCATE the table first - the truncate and
+                  COPY share one transaction so readers never see an
+                  empty table
+
+    Returns:
+        Number of rows copied
+    """
+    col_list = f" ({', '.join(columns)})" if columns else ""
+    sql = f"COPY {schema}.{table}{col_list} FROM STDIN WITH (FORMAT csv)"
+
+    # COPY is a psycopg-level protocol, not SQL - go through the raw
+    # DBAPI connection underneath the SQLAlchemy pool.
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor:
+            if truncate:
+                cursor.execute(f"TRUNCATE {schema}.{table}")
+            cursor.copy_expert(sql, buffer)
+            rowcount = cursor.rowcount
+        raw_conn.commit()
+        return rowcount
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
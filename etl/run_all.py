@@ -10,11 +10,26 @@ Usage:
     python -m etl.run_all --sample     # Use sample data (for demo)
 """
 import os
+import re
 import sys
+import shutil
 import logging
 import argparse
+import functools
+import subprocess
 from sqlalchemy import text
-from etl.config import get_engine, SQL_SCHEMA_DIR, SQL_MARTS_DIR
+from etl.config import get_engine, get_connection_string, SQL_SCHEMA_DIR, SQL_MARTS_DIR
+
+# sqlparse splits statements SQL-aware (dollar-quoted bodies, string
+# literals); the naive ';' split remains the fallback.
+try:
+    import sqlparse
+except ImportError:
+    sqlparse = None
+
+# A statement contains executable code if any line starts with
+# something other than whitespace or a '--' comment
+_SQL_CODE_RE = re.compile(r'(?m)^\s*[^-\s]')
 
 # Configure logging
 logging.basicConfig(
@@ -24,39 +39,83 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_sql_statements(filepath: str, mtime: float) -> tuple:
+    """Split a SQL file into statements, memoized on (path, mtime)."""
+    with open(filepath, 'r') as f:
+        sql = f.read()
+    raw_statements = sqlparse.split(sql) if sqlparse else sql.split(';')
+    # Drop empty and comment-only fragments here, once per file, so the
+    # execution loops run exactly what remains.
+    return tuple(
+        s.strip() for s in raw_statements
+        if s.strip() and _SQL_CODE_RE.search(s)
+    )
+
+
+def _load_sql_statements(filepath: str) -> tuple:
+    """Get the statements of a SQL file, re-parsing only when it changes."""
+    return _parse_sql_statements(filepath, os.path.getmtime(filepath))
+
+
+def _execute_sql_file(conn, filepath: str, ignore_exists: bool = False):
+    """
+    Execute a SQL file, whole-script first for a single round-trip and
+    one commit, falling back to a tolerant per-statement pass when any
+    part of the script fails (e.g. objects that already exist).
+    """
+    # Fastest and most correct path: let psql stream the file through
+    # the server-side parser (handles dollar quoting, COPY, \i). Without
+    # ON_ERROR_STOP it continues past failing statements, matching the
+    # tolerant behaviour of the fallback loop below.
+    if shutil.which('psql'):
+        result = subprocess.run(
+            ['psql', get_connection_string(), '-X', '-q', '-f', filepath],
+            capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            for line in result.stderr.splitlines():
+                if not (ignore_exists and 'already exists' in line.lower()):
+                    logger.warning(f"psql: {line}")
+            return
+        logger.info(f"psql execution failed ({result.stderr.strip()}); retrying in-process")
+
+    with open(filepath, 'r') as f:
+        sql = f.read()
+
+    try:
+        conn.exec_driver_sql(sql)
+        conn.commit()
+        return
+    except Exception as e:
+        conn.rollback()
+        logger.info(f"Whole-script execution failed ({e}); retrying per statement")
+
+    for stmt in _load_sql_statements(filepath):
+        try:
+            conn.execute(text(stmt))
+            conn.commit()  # Commit after each successful statement
+        except Exception as e:
+            # Rollback failed transaction and continue
+            conn.rollback()
+            # Ignore errors for things like "table already exists"
+            if not (ignore_exists and 'already exists' in str(e).lower()):
+                logger.warning(f"Statement warning: {e}")
+
+
 def init_database():
     """Initialize database schemas if they don't exist."""
     engine = get_engine()
-    
+
     # Run schema SQL files in order
     schema_files = sorted([f for f in os.listdir(SQL_SCHEMA_DIR) if f.endswith('.sql')])
-    
+
     with engine.connect() as conn:
         for schema_file in schema_files:
             filepath = os.path.join(SQL_SCHEMA_DIR, schema_file)
             logger.info(f"Executing {schema_file}...")
-            
-            with open(filepath, 'r') as f:
-                sql = f.read()
-                
-            # Split on semicolons and execute each statement
-            statements = [s.strip() for s in sql.split(';') if s.strip()]
-            for stmt in statements:
-                # Skip comments and empty statements
-                lines = [l for l in stmt.split('\n') if l.strip() and not l.strip().startswith('--')]
-                if not lines:
-                    continue
-                    
-                try:
-                    conn.execute(text(stmt))
-                    conn.commit()  # Commit after each successful statement
-                except Exception as e:
-                    # Rollback failed transaction and continue
-                    conn.rollback()
-                    # Ignore errors for things like "table already exists"
-                    if 'already exists' not in str(e).lower():
-                        logger.warning(f"Statement warning: {e}")
-    
+            _execute_sql_file(conn, filepath, ignore_exists=True)
+
     logger.info("Database schemas initialized!")
 
 
@@ -70,23 +129,7 @@ def build_marts():
         for mart_file in mart_files:
             filepath = os.path.join(SQL_MARTS_DIR, mart_file)
             logger.info(f"Executing {mart_file}...")
-            
-            with open(filepath, 'r') as f:
-                sql = f.read()
-                
-            statements = [s.strip() for s in sql.split(';') if s.strip()]
-            for stmt in statements:
-                # Skip comments and empty statements
-                lines = [l for l in stmt.split('\n') if l.strip() and not l.strip().startswith('--')]
-                if not lines:
-                    continue
-                    
-                try:
-                    conn.execute(text(stmt))
-                    conn.commit()
-                except Exception as e:
-                    conn.rollback()
-                    logger.warning(f"Mart statement warning: {e}")
+            _execute_sql_file(conn, filepath)
     
     logger.info("KPI mart views built!")
 
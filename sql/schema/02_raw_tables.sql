@@ -10,6 +10,16 @@
 -- No transformations are applied at this stage.
 -- ============================================
 
+-- Manifest of what each raw table was last loaded from, so re-runs can
+-- skip files whose content hash is unchanged.
+CREATE TABLE IF NOT EXISTS raw.ingest_manifest (
+    table_name VARCHAR(100) PRIMARY KEY,
+    source_path TEXT,
+    sha256 CHAR(64),
+    row_count INTEGER,
+    loaded_at TIMESTAMPTZ DEFAULT now()
+);
+
 -- Placeholder comment - tables created by ETL:
 -- raw.orders (from orders_export_1.csv)
 -- raw.products (from products_export_1.csv)  
@@ -37,9 +37,16 @@ CREATE TABLE staging.stg_orders (
     paid_at TIMESTAMP WITH TIME ZONE,
     fulfilled_at TIMESTAMP WITH TIME ZONE,
     cancelled_at TIMESTAMP WITH TIME ZONE,
-    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- PII-safe customer ID, computed once at insert instead of at every join
+    email_hash TEXT GENERATED ALWAYS AS (encode(sha256(lower(email)::bytea), 'hex')) STORED,
+    -- Pre-lowered email so joins are plain equality instead of LOWER() per comparison
+    email_lc TEXT GENERATED ALWAYS AS (lower(email)) STORED
 );
 
+CREATE INDEX idx_stg_orders_email_hash ON staging.stg_orders(email_hash);
+CREATE INDEX idx_stg_orders_email_lc ON staging.stg_orders(email_lc);
+
 -- ----------------------------------------
 -- STAGING: Order Lines (1 row per line item)
 -- ----------------------------------------
@@ -102,9 +109,13 @@ CREATE TABLE staging.stg_customers (
     zip VARCHAR(20),
     total_spent NUMERIC(10, 2),
     total_orders INTEGER,
-    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Pre-lowered email so joins are plain equality instead of LOWER() per comparison
+    email_lc TEXT GENERATED ALWAYS AS (lower(email)) STORED
 );
 
+CREATE INDEX idx_stg_customers_email_lc ON staging.stg_customers(email_lc);
+
 -- ----------------------------------------
 -- STAGING: Product SKU Map
 -- ----------------------------------------
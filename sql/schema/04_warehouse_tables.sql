@@ -3,6 +3,20 @@
 -- 04_warehouse_tables.sql - Star Schema
 -- ============================================
 
+-- ----------------------------------------
+-- ETL watermarks (incremental refresh)
+-- ----------------------------------------
+-- Deliberately CREATE IF NOT EXISTS (no DROP): watermarks must survive
+-- schema re-runs. They are reset below because the tables they track
+-- are dropped and recreated by this file.
+CREATE TABLE IF NOT EXISTS warehouse.etl_watermark (
+    table_name VARCHAR(100) PRIMARY KEY,
+    last_ts TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+DELETE FROM warehouse.etl_watermark;
+
 -- ----------------------------------------
 -- DIMENSION: Date
 -- ----------------------------------------
@@ -176,15 +190,20 @@ CREATE TABLE warehouse.fact_order (
 -- ----------------------------------------
 -- FACT: Order Line (1 row per line item)
 -- ----------------------------------------
+-- Range-partitioned by order_date_key so incremental refresh and date
+-- filters touch only the relevant year, and partition-wise plans can
+-- parallelize across years. The PK must include the partition key, so
+-- fact_cogs_estimate carries order_line_key without a formal FK (the
+-- ETL populates both in the same transaction).
 DROP TABLE IF EXISTS warehouse.fact_order_line CASCADE;
 CREATE TABLE warehouse.fact_order_line (
-    order_line_key SERIAL PRIMARY KEY,
+    order_line_key SERIAL,
     order_key INTEGER REFERENCES warehouse.fact_order(order_key),
     order_id BIGINT,
     line_number INTEGER,
     product_key INTEGER REFERENCES warehouse.dim_product(product_key),
     order_date_key INTEGER REFERENCES warehouse.dim_date(date_key),
-    
+
     -- Line-level amounts
     quantity INTEGER,
     unit_price NUMERIC(10, 2),
@@ -192,34 +211,55 @@ CREATE TABLE warehouse.fact_order_line (
     line_discount NUMERIC(10, 2),       -- direct line discount
     allocated_order_discount NUMERIC(10, 2),  -- proportionally allocated order discount
     net_line_revenue NUMERIC(10, 2),    -- gross - line_discount - allocated_order_discount
-    
+
     -- COGS (from recipe)
     estimated_cogs NUMERIC(10, 4),
     has_missing_cost BOOLEAN,
     gross_margin NUMERIC(10, 4),
     margin_percent NUMERIC(10, 4),
-    
-    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_line_key, order_date_key)
+) PARTITION BY RANGE (order_date_key);
+
+CREATE TABLE warehouse.fact_order_line_2025 PARTITION OF warehouse.fact_order_line
+    FOR VALUES FROM (20250101) TO (20260101);
+CREATE TABLE warehouse.fact_order_line_2026 PARTITION OF warehouse.fact_order_line
+    FOR VALUES FROM (20260101) TO (20270101);
+CREATE TABLE warehouse.fact_order_line_2027 PARTITION OF warehouse.fact_order_line
+    FOR VALUES FROM (20270101) TO (20280101);
+CREATE TABLE warehouse.fact_order_line_default PARTITION OF warehouse.fact_order_line
+    DEFAULT;
 
 -- ----------------------------------------
 -- FACT: COGS Estimate (detail by material)
 -- ----------------------------------------
 DROP TABLE IF EXISTS warehouse.fact_cogs_estimate CASCADE;
 CREATE TABLE warehouse.fact_cogs_estimate (
-    cogs_key SERIAL PRIMARY KEY,
-    order_line_key INTEGER REFERENCES warehouse.fact_order_line(order_line_key),
+    cogs_key SERIAL,
+    order_line_key INTEGER,  -- fact_order_line key; no FK across partitions
+    order_date_key INTEGER REFERENCES warehouse.dim_date(date_key),
     product_key INTEGER REFERENCES warehouse.dim_product(product_key),
     material_key INTEGER REFERENCES warehouse.dim_material(material_key),
-    
+
     ingredient_name VARCHAR(255),
     amount_ml NUMERIC(10, 4),
     cost_per_ml NUMERIC(10, 4),
     line_cost NUMERIC(10, 4),
     has_known_cost BOOLEAN,
-    
-    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (cogs_key, order_date_key)
+) PARTITION BY RANGE (order_date_key);
+
+CREATE TABLE warehouse.fact_cogs_estimate_2025 PARTITION OF warehouse.fact_cogs_estimate
+    FOR VALUES FROM (20250101) TO (20260101);
+CREATE TABLE warehouse.fact_cogs_estimate_2026 PARTITION OF warehouse.fact_cogs_estimate
+    FOR VALUES FROM (20260101) TO (20270101);
+CREATE TABLE warehouse.fact_cogs_estimate_2027 PARTITION OF warehouse.fact_cogs_estimate
+    FOR VALUES FROM (20270101) TO (20280101);
+CREATE TABLE warehouse.fact_cogs_estimate_default PARTITION OF warehouse.fact_cogs_estimate
+    DEFAULT;
 
 -- ----------------------------------------
 -- FACT: Marketing Spend (Optional)
@@ -17,50 +17,70 @@ def db_connection():
     conn.close()
 
 
+@pytest.fixture(scope='module')
+def raw_counts(db_connection):
+    """All raw-layer row counts, fetched in one round-trip."""
+    return db_connection.execute(text("""
+        SELECT
+            (SELECT COUNT(*) FROM raw.orders) as orders,
+            (SELECT COUNT(*) FROM raw.product_sku_map) as product_sku_map,
+            (SELECT COUNT(*) FROM raw.material_costs) as material_costs,
+            (SELECT COUNT(*) FROM raw.recipes) as recipes
+    """)).mappings().one()
+
+
+@pytest.fixture(scope='module')
+def warehouse_counts(db_connection):
+    """All warehouse-layer row counts, fetched in one round-trip."""
+    return db_connection.execute(text("""
+        SELECT
+            (SELECT COUNT(*) FROM warehouse.fact_order) as fact_order,
+            (SELECT COUNT(*) FROM warehouse.fact_order_line) as fact_order_line,
+            (SELECT COUNT(*) FROM warehouse.dim_product) as dim_product,
+            (SELECT COUNT(*) FROM warehouse.dim_customer) as dim_customer,
+            (SELECT COUNT(*) FROM warehouse.dim_date) as dim_date
+    """)).mappings().one()
+
+
 class TestRawDataQuality:
     """Tests for raw data layer."""
     
-    def test_orders_not_empty(self, db_connection):
+    def test_orders_not_empty(self, raw_counts):
         """Verify orders table has data."""
-        result = db_connection.execute(text("SELECT COUNT(*) FROM raw.orders")).scalar()
-        assert result > 0, "raw.orders table is empty"
+        assert raw_counts['orders'] > 0, "raw.orders table is empty"
     
     def test_orders_have_ids(self, db_connection):
         """Verify all orders have IDs."""
+        # EXISTS stops at the first bad row instead of scanning them all
         result = db_connection.execute(text("""
-            SELECT COUNT(*) FROM raw.orders 
-            WHERE id IS NULL OR id = ''
+            SELECT EXISTS(
+                SELECT 1 FROM raw.orders
+                WHERE id IS NULL OR id = ''
+            )
         """)).scalar()
-        assert result == 0, f"Found {result} orders with null/empty IDs"
-    
+        assert not result, "Found orders with null/empty IDs"
+
     def test_orders_have_dates(self, db_connection):
         """Verify all orders have created_at dates."""
         result = db_connection.execute(text("""
-            SELECT COUNT(*) FROM raw.orders 
-            WHERE created_at IS NULL OR created_at = ''
+            SELECT EXISTS(
+                SELECT 1 FROM raw.orders
+                WHERE created_at IS NULL OR created_at = ''
+            )
         """)).scalar()
-        assert result == 0, f"Found {result} orders with null/empty created_at"
+        assert not result, "Found orders with null/empty created_at"
     
-    def test_product_sku_map_exists(self, db_connection):
+    def test_product_sku_map_exists(self, raw_counts):
         """Verify product SKU mapping is loaded."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM raw.product_sku_map"
-        )).scalar()
-        assert result > 0, "Product SKU map is empty"
-    
-    def test_material_costs_loaded(self, db_connection):
+        assert raw_counts['product_sku_map'] > 0, "Product SKU map is empty"
+
+    def test_material_costs_loaded(self, raw_counts):
         """Verify material costs are loaded."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM raw.material_costs"
-        )).scalar()
-        assert result > 0, "Material costs table is empty"
-    
-    def test_recipes_loaded(self, db_connection):
+        assert raw_counts['material_costs'] > 0, "Material costs table is empty"
+
+    def test_recipes_loaded(self, raw_counts):
         """Verify recipes are loaded."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM raw.recipes"
-        )).scalar()
-        assert result > 0, "Recipes table is empty"
+        assert raw_counts['recipes'] > 0, "Recipes table is empty"
 
 
 class TestStagingDataQuality:
@@ -84,22 +104,23 @@ class TestStagingDataQuality:
     def test_staging_amounts_non_negative(self, db_connection):
         """Verify all amounts are non-negative."""
         result = db_connection.execute(text("""
-            SELECT COUNT(*) FROM staging.stg_orders 
-            WHERE subtotal < 0 OR total < 0 OR shipping < 0
+            SELECT EXISTS(
+                SELECT 1 FROM staging.stg_orders
+                WHERE subtotal < 0 OR total < 0 OR shipping < 0
+            )
         """)).scalar()
-        assert result == 0, f"Found {result} orders with negative amounts"
+        assert not result, "Found orders with negative amounts"
     
     def test_staging_no_duplicate_orders(self, db_connection):
         """Verify no duplicate order IDs in staging."""
         result = db_connection.execute(text("""
-            SELECT COUNT(*) FROM (
-                SELECT order_id, COUNT(*) as cnt 
-                FROM staging.stg_orders 
-                GROUP BY order_id 
+            SELECT EXISTS(
+                SELECT 1 FROM staging.stg_orders
+                GROUP BY order_id
                 HAVING COUNT(*) > 1
-            ) dupes
+            )
         """)).scalar()
-        assert result == 0, f"Found {result} duplicate order IDs"
+        assert not result, "Found duplicate order IDs in staging"
 
 
 class TestProductMapping:
@@ -132,40 +153,25 @@ class TestProductMapping:
 class TestWarehouseDataQuality:
     """Tests for warehouse (star schema) layer."""
     
-    def test_fact_order_populated(self, db_connection):
+    def test_fact_order_populated(self, warehouse_counts):
         """Verify fact_order has data."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM warehouse.fact_order"
-        )).scalar()
-        assert result > 0, "warehouse.fact_order is empty"
-    
-    def test_fact_order_line_populated(self, db_connection):
+        assert warehouse_counts['fact_order'] > 0, "warehouse.fact_order is empty"
+
+    def test_fact_order_line_populated(self, warehouse_counts):
         """Verify fact_order_line has data."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM warehouse.fact_order_line"
-        )).scalar()
-        assert result > 0, "warehouse.fact_order_line is empty"
-    
-    def test_dim_product_populated(self, db_connection):
+        assert warehouse_counts['fact_order_line'] > 0, "warehouse.fact_order_line is empty"
+
+    def test_dim_product_populated(self, warehouse_counts):
         """Verify dim_product has data."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM warehouse.dim_product"
-        )).scalar()
-        assert result > 0, "warehouse.dim_product is empty"
-    
-    def test_dim_customer_populated(self, db_connection):
+        assert warehouse_counts['dim_product'] > 0, "warehouse.dim_product is empty"
+
+    def test_dim_customer_populated(self, warehouse_counts):
         """Verify dim_customer has data."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM warehouse.dim_customer"
-        )).scalar()
-        assert result > 0, "warehouse.dim_customer is empty"
-    
-    def test_dim_date_populated(self, db_connection):
+        assert warehouse_counts['dim_customer'] > 0, "warehouse.dim_customer is empty"
+
+    def test_dim_date_populated(self, warehouse_counts):
         """Verify dim_date has data."""
-        result = db_connection.execute(text(
-            "SELECT COUNT(*) FROM warehouse.dim_date"
-        )).scalar()
-        assert result > 0, "warehouse.dim_date is empty"
+        assert warehouse_counts['dim_date'] > 0, "warehouse.dim_date is empty"
 
 
 class TestKPIValidation:
@@ -173,79 +179,109 @@ class TestKPIValidation:
     
     def test_subtotal_validation(self, db_connection):
         """Verify: gross_product_sales - discount ≈ subtotal."""
-        result = db_connection.execute(text("""
-            SELECT 
-                order_id,
-                gross_product_sales,
-                order_discount_amount,
-                subtotal,
-                ABS(subtotal - (gross_product_sales - order_discount_amount)) as diff
-            FROM warehouse.fact_order
+        # Count violations first; only fetch detail rows on failure
+        count = db_connection.execute(text("""
+            SELECT COUNT(*) FROM warehouse.fact_order
             WHERE ABS(subtotal - (gross_product_sales - order_discount_amount)) > 0.01
-        """)).fetchall()
-        
-        if result:
+        """)).scalar()
+
+        if count:
+            result = db_connection.execute(text("""
+                SELECT
+                    order_id,
+                    gross_product_sales,
+                    order_discount_amount,
+                    subtotal,
+                    ABS(subtotal - (gross_product_sales - order_discount_amount)) as diff
+                FROM warehouse.fact_order
+                WHERE ABS(subtotal - (gross_product_sales - order_discount_amount)) > 0.01
+                ORDER BY diff DESC
+                LIMIT 10
+            """)).fetchall()
             failures = [
                 f"Order {row[0]}: gross={row[1]}, discount={row[2]}, subtotal={row[3]}, diff={row[4]}"
                 for row in result
             ]
-            pytest.fail(f"Subtotal validation failed:\n" + "\n".join(failures))
+            pytest.fail(f"Subtotal validation failed for {count} orders, worst:\n" + "\n".join(failures))
     
     def test_total_validation(self, db_connection):
         """Verify: subtotal + shipping + taxes = total."""
-        result = db_connection.execute(text("""
-            SELECT 
-                order_id,
-                subtotal,
-                shipping_amount,
-                tax_amount,
-                total_amount,
-                ABS(total_amount - (subtotal + shipping_amount + tax_amount)) as diff
-            FROM warehouse.fact_order
+        count = db_connection.execute(text("""
+            SELECT COUNT(*) FROM warehouse.fact_order
             WHERE ABS(total_amount - (subtotal + shipping_amount + tax_amount)) > 0.01
-        """)).fetchall()
-        
-        if result:
+        """)).scalar()
+
+        if count:
+            result = db_connection.execute(text("""
+                SELECT
+                    order_id,
+                    subtotal,
+                    shipping_amount,
+                    tax_amount,
+                    total_amount,
+                    ABS(total_amount - (subtotal + shipping_amount + tax_amount)) as diff
+                FROM warehouse.fact_order
+                WHERE ABS(total_amount - (subtotal + shipping_amount + tax_amount)) > 0.01
+                ORDER BY diff DESC
+                LIMIT 10
+            """)).fetchall()
             failures = [
                 f"Order {row[0]}: subtotal={row[1]}, ship={row[2]}, tax={row[3]}, total={row[4]}, diff={row[5]}"
                 for row in result
             ]
-            pytest.fail(f"Total validation failed:\n" + "\n".join(failures))
+            pytest.fail(f"Total validation failed for {count} orders, worst:\n" + "\n".join(failures))
     
     def test_net_sales_non_negative(self, db_connection):
         """Verify net_sales is non-negative."""
         result = db_connection.execute(text("""
-            SELECT COUNT(*) FROM warehouse.fact_order 
-            WHERE net_sales < 0
+            SELECT EXISTS(
+                SELECT 1 FROM warehouse.fact_order
+                WHERE net_sales < 0
+            )
         """)).scalar()
-        assert result == 0, f"Found {result} orders with negative net_sales"
+        assert not result, "Found orders with negative net_sales"
     
     def test_line_revenue_sums_to_order(self, db_connection):
         """Verify line-level revenues sum to order-level."""
-        result = db_connection.execute(text("""
+        count = db_connection.execute(text("""
             WITH line_sums AS (
-                SELECT 
+                SELECT
                     order_key,
                     SUM(gross_line_revenue) as line_gross
                 FROM warehouse.fact_order_line
                 GROUP BY order_key
             )
-            SELECT 
-                fo.order_id,
-                fo.gross_product_sales,
-                ls.line_gross,
-                ABS(fo.gross_product_sales - ls.line_gross) as diff
+            SELECT COUNT(*)
             FROM warehouse.fact_order fo
             JOIN line_sums ls ON fo.order_key = ls.order_key
             WHERE ABS(fo.gross_product_sales - ls.line_gross) > 0.01
-        """)).fetchall()
-        
-        if result:
+        """)).scalar()
+
+        if count:
+            result = db_connection.execute(text("""
+                WITH line_sums AS (
+                    SELECT
+                        order_key,
+                        SUM(gross_line_revenue) as line_gross
+                    FROM warehouse.fact_order_line
+                    GROUP BY order_key
+                )
+                SELECT
+                    fo.order_id,
+                    fo.gross_product_sales,
+                    ls.line_gross,
+                    ABS(fo.gross_product_sales - ls.line_gross) as diff
+                FROM warehouse.fact_order fo
+                JOIN line_sums ls ON fo.order_key = ls.order_key
+                WHERE ABS(fo.gross_product_sales - ls.line_gross) > 0.01
+                ORDER BY diff DESC
+                LIMIT 10
+            """)).fetchall()
             failures = [
                 f"Order {row[0]}: order_gross={row[1]}, line_sum={row[2]}, diff={row[3]}"
                 for row in result
             ]
-            pytest.fail(f"Line revenue sum validation failed:\n" + "\n".join(failures))
+            pytest.fail(f"Line revenue sum validation failed for {count} orders, worst:\n" + "\n".join(failures))
 
 
 class TestCOGSCalculation: